@@ -1,97 +1,504 @@
-from fastapi import FastAPI
-import ntplib
-import pendulum
-from typing import Optional
+import asyncio
+import functools
+import os
+import socket
+import struct
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
+import orjson
 
-app = FastAPI()
+def check_server_name(name: str) -> str:
+    """
+    Reject NTP server names that can never resolve, so a mistyped
+    NTP_PRIMARY_SERVER fails at startup instead of on every refresh.
+    """
+    try:
+        if not name or not name.encode("idna"):
+            raise UnicodeError("empty name")
+    except UnicodeError as e:
+        raise ValueError(f"Invalid NTP server name {name!r}: {e}") from None
+    return name
+
+# Queried together; the first server to answer wins. The primary defaults to
+# the pool, whose DNS hands out nearby servers. None of these smear leap
+# seconds: mixing smearing servers (e.g. time.google.com) into the race could
+# make answers disagree by up to half a second around a leap second.
+NTP_PRIMARY_SERVER = check_server_name(
+    os.environ.get("NTP_PRIMARY_SERVER", "pool.ntp.org")
+)
+NTP_SERVERS = (NTP_PRIMARY_SERVER, "time.nist.gov", "time.cloudflare.com")
+NTP_PORT = 123
+NTP_VERSION = 3
+
+# Seconds to wait for a server, including resolving its name
+NTP_TIMEOUT = 3.0
+
+# Seconds between the NTP epoch (1900) and the UNIX epoch (1970)
+NTP_EPOCH_OFFSET = 2208988800
+
+# How long resolved server addresses are reused before resolving again
+DNS_TTL = 60.0
+
+# How long an address that failed to answer is kept out of rotation, even
+# if DNS keeps returning it
+FAILED_ADDRESS_TTL = 300.0
+
+class NTPError(Exception):
+    """Raised when an NTP server does not give a usable reply."""
+
+def build_ntp_query() -> bytes:
+    """
+    Build a 48-byte NTP client request. The transmit timestamp is set so
+    the server echoes it back, letting replies be matched to this query.
+    """
+    now = time.time() + NTP_EPOCH_OFFSET
+    # LI 0, version, mode 3 (client)
+    header = bytes([NTP_VERSION << 3 | 3])
+    return header + bytes(39) + struct.pack(
+        "!II", int(now), int((now % 1) * 2**32)
+    )
+
+def parse_ntp_reply(data: bytes, version: int = NTP_VERSION) -> float:
+    """
+    Return the server transmit time of an NTP reply as a UNIX timestamp.
+    Raises NTPError unless the reply comes from a synchronized server
+    answering a query of the given version.
+    """
+    fields = struct.unpack("!12I", data[:48])
+    leap, reply_version = fields[0] >> 30, (fields[0] >> 27) & 0x7
+    mode, stratum = (fields[0] >> 24) & 0x7, (fields[0] >> 16) & 0xff
+    if mode != 4 or reply_version != version:
+        raise NTPError("Invalid NTP reply.")
+    if stratum == 0:
+        # Kiss-of-death telling us to back off
+        raise NTPError("NTP server refused the query.")
+    if leap == 3 or stratum >= 16:
+        raise NTPError("NTP server is not synchronized.")
+    if fields[10] == 0 and fields[11] == 0:
+        raise NTPError("NTP reply has no transmit time.")
+    return fields[10] + fields[11] / 2**32 - NTP_EPOCH_OFFSET
+
+class NTPProtocol(asyncio.DatagramProtocol):
+    """
+    A connected UDP endpoint to one NTP server, reused across queries.
+    Replies are matched to pending queries by their originate timestamp, so
+    late replies to queries that already timed out are ignored.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.waiters = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def query(self) -> asyncio.Future:
+        """Send a query and return a future for the raw reply."""
+        query = build_ntp_query()
+        key = query[40:48]
+        reply = asyncio.get_running_loop().create_future()
+        self.waiters[key] = reply
+        reply.add_done_callback(lambda _: self.waiters.pop(key, None))
+        self.transport.sendto(query)
+        return reply
+
+    def datagram_received(self, data, addr):
+        # A reply must echo a query's transmit timestamp as its originate one
+        reply = self.waiters.get(data[24:32]) if len(data) >= 48 else None
+        if reply is not None and not reply.done():
+            reply.set_result(data)
+
+    def _fail_all(self, exc):
+        for reply in list(self.waiters.values()):
+            if not reply.done():
+                reply.set_exception(exc)
+
+    def error_received(self, exc):
+        # ICMP errors can't be tied to one query, so fail every pending one
+        self._fail_all(exc)
 
-def format_gmt_offset(dt: pendulum.DateTime) -> str:
+    def connection_lost(self, exc):
+        self._fail_all(exc or NTPError("Connection closed."))
+
+# Last NTP reading and the monotonic clock value it was taken at. Requests
+# within the TTL extrapolate from this instead of querying the server again.
+_ntp_cache = {
+    "tx_time": None, "anchor": 0.0, "ttl": 5.0,
+    # A failed refresh is remembered for `backoff` seconds so requests queued
+    # on the lock fail fast instead of each running its own query in turn.
+    "error": None, "error_at": 0.0, "backoff": 1.0
+}
+_ntp_lock = asyncio.Lock()
+
+# Resolved addresses per server name, handed out round-robin until expiry
+_dns_cache = {}
+
+# Monotonic time each address last failed to answer
+_failed_addresses = {}
+
+# Open NTPProtocol endpoints per address
+_endpoints = {}
+
+async def get_endpoint(address: str) -> NTPProtocol:
+    """
+    Return the open endpoint for an address, creating it on first use.
+    """
+    protocol = _endpoints.get(address)
+    if protocol is not None and not protocol.transport.is_closing():
+        return protocol
+
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        NTPProtocol, remote_addr=(address, NTP_PORT)
+    )
+    # Another query may have opened one while we were connecting
+    existing = _endpoints.get(address)
+    if existing is not None and not existing.transport.is_closing():
+        transport.close()
+        return existing
+    _endpoints[address] = protocol
+    return protocol
+
+def close_endpoint(address: str):
+    """
+    Close and forget the endpoint for an address, if there is one.
+    """
+    protocol = _endpoints.pop(address, None)
+    if protocol is not None:
+        protocol.transport.close()
+
+async def refresh_server_addresses(server: str) -> dict:
     """
-    Format the GMT offset accurately using pendulum's built-in offset handling.
-    Returns format like 'GMT +5:30' or 'GMT -4:00'
+    Resolve an NTP server and replace its cached addresses, closing
+    endpoints for addresses that are no longer returned. If DNS fails and
+    the server has cached addresses, those stay in use until the next
+    refresh.
     """
-    # Get total offset in seconds
-    offset_seconds = dt.offset
+    previous = _dns_cache.get(server)
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(server, NTP_PORT, type=socket.SOCK_DGRAM)
+    except (OSError, UnicodeError):
+        if previous is None:
+            raise
+        previous["expires"] = time.monotonic() + DNS_TTL
+        return previous
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    
+    # Keep recently failed addresses out, unless that would leave none
+    now = time.monotonic()
+    for address, failed_at in list(_failed_addresses.items()):
+        if now - failed_at >= FAILED_ADDRESS_TTL:
+            del _failed_addresses[address]
+    addresses = [a for a in addresses if a not in _failed_addresses] or addresses
+    
+    if previous is not None:
+        for address in set(previous["addresses"]) - set(addresses):
+            close_endpoint(address)
     
-    # Convert to hours and minutes
-    total_minutes = offset_seconds // 60
-    hours = total_minutes // 60
-    minutes = abs(total_minutes % 60)
+    entry = _dns_cache[server] = {
+        "addresses": addresses,
+        "expires": now + DNS_TTL,
+        "next": previous["next"] if previous is not None else 0
+    }
+    return entry
+
+async def refresh_all_server_addresses():
+    """
+    Resolve every NTP server. Failures are left for resolve_server to retry
+    when the server is next queried.
+    """
+    await asyncio.gather(
+        *(refresh_server_addresses(server) for server in NTP_SERVERS),
+        return_exceptions=True
+    )
+
+async def refresh_addresses_periodically():
+    """
+    Keep the address cache warm so DNS stays off the request path.
+    """
+    while True:
+        await asyncio.sleep(DNS_TTL / 2)
+        await refresh_all_server_addresses()
+
+async def resolve_server(server: str) -> str:
+    """
+    Return an address for an NTP server, rotating through its cached DNS
+    results. The server is only resolved here if it has no fresh entry;
+    normally the background refresh keeps entries fresh.
+    """
+    entry = _dns_cache.get(server)
+    if entry is None or time.monotonic() >= entry["expires"]:
+        entry = await refresh_server_addresses(server)
+
+    addresses = entry["addresses"]
+    address = addresses[entry["next"] % len(addresses)]
+    entry["next"] += 1
+    return address
+
+def drop_address(server: str, address: str):
+    """
+    Stop using an address that failed to answer. The server is resolved
+    again only once all of its cached addresses have been dropped, and
+    refreshes skip the address for FAILED_ADDRESS_TTL.
+    """
+    _failed_addresses[address] = time.monotonic()
+    entry = _dns_cache.get(server)
+    if entry is not None and address in entry["addresses"]:
+        entry["addresses"].remove(address)
+        if not entry["addresses"]:
+            del _dns_cache[server]
+    close_endpoint(address)
+
+async def query_server(server: str, attempt: dict) -> float:
+    """
+    Resolve a server and query it over its persistent UDP endpoint,
+    recording the address used in `attempt` so a failure can be attributed
+    to it.
+    """
+    try:
+        attempt["address"] = await resolve_server(server)
+    except (OSError, UnicodeError) as e:
+        # UnicodeError: names the resolver can't encode, e.g. "foo..bar"
+        raise NTPError(f"Cannot resolve {server}: {e}")
+    protocol = await get_endpoint(attempt["address"])
+    return parse_ntp_reply(await protocol.query())
+
+async def ntp_request(server: str) -> float:
+    """
+    Query a single NTP server and return its transmit time as a UNIX
+    timestamp, giving up after NTP_TIMEOUT including DNS resolution.
+    """
+    attempt = {}
+    try:
+        return await asyncio.wait_for(
+            query_server(server, attempt), timeout=NTP_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        if "address" in attempt:
+            drop_address(server, attempt["address"])
+        raise NTPError("No response received from %s." % server)
+    except (NTPError, OSError):
+        if "address" in attempt:
+            drop_address(server, attempt["address"])
+        raise
+
+async def query_ntp_servers() -> float:
+    """
+    Query all NTP servers concurrently and return the transmit time of the
+    first successful reply, cancelling the remaining queries. Raises
+    NTPError for the last failure if every server fails.
+    """
+    servers = {
+        asyncio.create_task(ntp_request(server)): server
+        for server in NTP_SERVERS
+    }
+    pending = set(servers)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    return task.result()
+                except NTPError as e:
+                    error = e
+                except OSError as e:
+                    # DNS or socket failure on one server shouldn't fail the race
+                    error = NTPError(f"{servers[task]}: {e}")
+    finally:
+        # Losers are cancelled rather than timed out, so an address that
+        # never answers is only dropped once it fails a race on its own;
+        # until then it costs one unanswered query per refresh.
+        for task in servers:
+            task.cancel()
+            # Retrieve failures of servers that lost the race so asyncio
+            # doesn't log them as never retrieved
+            task.add_done_callback(
+                lambda t: t.cancelled() or t.exception()
+            )
+    raise error
+
+async def get_ntp_timestamp() -> float:
+    """
+    Return the current NTP time as a UNIX timestamp, querying the NTP server
+    at most once per cache TTL.
+    """
+    tx_time = _ntp_cache["tx_time"]
+    elapsed = time.monotonic() - _ntp_cache["anchor"]
+    if tx_time is not None and elapsed < _ntp_cache["ttl"]:
+        return tx_time + elapsed
+
+    async with _ntp_lock:
+        # Another request may have refreshed the cache while we waited
+        tx_time = _ntp_cache["tx_time"]
+        elapsed = time.monotonic() - _ntp_cache["anchor"]
+        if tx_time is not None and elapsed < _ntp_cache["ttl"]:
+            return tx_time + elapsed
+
+        # A refresh that just failed is not retried until the backoff passes
+        error = _ntp_cache["error"]
+        since_error = time.monotonic() - _ntp_cache["error_at"]
+        if error is not None and since_error < _ntp_cache["backoff"]:
+            raise NTPError(error)
+
+        try:
+            tx_time = await query_ntp_servers()
+        except NTPError as e:
+            _ntp_cache["error"], _ntp_cache["error_at"] = str(e), time.monotonic()
+            raise
+        anchor = time.monotonic()
+        _ntp_cache["error"] = None
+        _ntp_cache["tx_time"], _ntp_cache["anchor"] = tx_time, anchor
+        return tx_time
+
+UTC = timezone.utc
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resolve servers before taking traffic, then keep them fresh
+    await refresh_all_server_addresses()
+    refresher = asyncio.create_task(refresh_addresses_periodically())
+    yield
+    refresher.cancel()
+    for address in list(_endpoints):
+        close_endpoint(address)
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name: str) -> ZoneInfo:
+    """
+    Look up a timezone by name once and reuse the object for later requests.
+    Raises ZoneInfoNotFoundError for unknown names (these are not cached).
+    """
+    try:
+        return ZoneInfo(name)
+    except OSError as e:
+        # Names of directories under TZPATH, e.g. "America"
+        raise ZoneInfoNotFoundError(f"No time zone found with key {name}") from e
+
+@functools.lru_cache(maxsize=4096)
+def format_gmt_offset(offset_seconds: int) -> str:
+    """
+    Format a UTC offset given in seconds. Results are memoized since only a
+    few thousand distinct offsets exist.
+    Returns format like 'GMT +05:30' or 'GMT -03:30'
+    """
+    # Split the magnitude so negative offsets don't floor to the wrong hour
+    hours, minutes = divmod(abs(offset_seconds) // 60, 60)
     
     # Determine sign
     sign = '+' if offset_seconds >= 0 else '-'
     
-    return f"GMT {sign}{abs(hours):02d}:{minutes:02d}"
+    return f"GMT {sign}{hours:02d}:{minutes:02d}"
+
+def format_date(dt: datetime) -> str:
+    """Format as 'YYYY-MM-DD' without going through strftime."""
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+
+def format_time(dt: datetime) -> str:
+    """Format as 'HH:MM:SS' without going through strftime."""
+    return f"{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
+
+def build_time_payload(tx_time: float, tz_name: str) -> dict:
+    """
+    Build the /time response body for an NTP timestamp and timezone name.
+    """
+    # Get UTC time
+    utc_dt = datetime.fromtimestamp(tx_time, UTC)
+    
+    # Convert to requested timezone
+    local_dt = utc_dt.astimezone(get_timezone(tz_name))
+    
+    # Calculate precise offset
+    offset_seconds = int(local_dt.utcoffset().total_seconds())
+    offset_hours = offset_seconds / 3600  
+    
+    # Get GMT format with offset
+    gmt_format = format_gmt_offset(offset_seconds)
+    
+    # The GMT and local entries show the same wall-clock time
+    local_date = format_date(local_dt)
+    local_time = format_time(local_dt)
+    
+    return {
+        "timestamp": int(tx_time),
+        "times": {
+            "utc": {
+                "date": format_date(utc_dt),
+                "time": format_time(utc_dt),
+                "timezone": "UTC",
+                "offset_seconds": 0,
+                "offset_hours": 0
+            },
+            "gmt": {
+                "date": local_date,
+                "time": local_time,
+                "timezone": gmt_format,
+                "offset_seconds": offset_seconds,
+                "offset_hours": offset_hours
+            },
+            "local": {
+                "date": local_date,
+                "time": local_time,
+                "timezone": tz_name,
+                "offset_seconds": offset_seconds,
+                "offset_hours": offset_hours,
+                "is_dst": bool(local_dt.dst())  
+            }
+        },
+        "status": "success"
+    }
+
+# The body only changes once per second, so serialized bodies are kept per
+# timezone for the current second and dropped when the second rolls over.
+_response_cache = {"second": None, "bodies": {}}
 
 @app.get("/time")
-async def get_server_time(timezone: str = "America/Argentina/San_Juan"):
+async def get_server_time(timezone: str = "America/Argentina/San_Juan") -> Response:
     """
-    Fetch current time from NIST server and return UTC, GMT, and local timezone times
+    Fetch current time from NTP servers and return UTC, GMT, and local timezone times
     with accurate offset calculations.
     
     Args:
-        timezone (str): Target timezone (default: "Asia/Kolkata")
+        timezone (str): Target timezone (default: "America/Argentina/San_Juan")
     
     Returns:
-        dict: Contains UTC, GMT, and local timezone times with precise offsets
+        Response: JSON with UTC, GMT, and local timezone times with precise offsets
     """
     try:
         # Get NTP time
-        client = ntplib.NTPClient()
-        response = client.request("time.nist.gov", version=3)
+        tx_time = await get_ntp_timestamp()
         
-        # Get UTC time
-        utc_dt = pendulum.from_timestamp(response.tx_time)
+        second = int(tx_time)
+        if _response_cache["second"] != second:
+            _response_cache["second"], _response_cache["bodies"] = second, {}
+        bodies = _response_cache["bodies"]
         
-        # Convert to requested timezone
-        local_dt = utc_dt.in_timezone(timezone)
+        body = bodies.get(timezone)
+        if body is None:
+            body = orjson.dumps(build_time_payload(tx_time, timezone))
+            bodies[timezone] = body
         
-        # Calculate precise offset
-        offset_seconds = local_dt.offset
-        offset_hours = offset_seconds / 3600  
-        
-        # Get GMT format with offset
-        gmt_format = format_gmt_offset(local_dt)
-        
-        return {
-            "timestamp": int(response.tx_time),
-            "times": {
-                "utc": {
-                    "date": utc_dt.format('YYYY-MM-DD'),
-                    "time": utc_dt.format('HH:mm:ss'),
-                    "timezone": "UTC",
-                    "offset_seconds": 0,
-                    "offset_hours": 0
-                },
-                "gmt": {
-                    "date": local_dt.format('YYYY-MM-DD'),
-                    "time": local_dt.format('HH:mm:ss'),
-                    "timezone": gmt_format,
-                    "offset_seconds": offset_seconds,
-                    "offset_hours": offset_hours
-                },
-                "local": {
-                    "date": local_dt.format('YYYY-MM-DD'),
-                    "time": local_dt.format('HH:mm:ss'),
-                    "timezone": timezone,
-                    "offset_seconds": offset_seconds,
-                    "offset_hours": offset_hours,
-                    "is_dst": local_dt.is_dst()  
-                }
-            },
-            "status": "success"
-        }
+        return Response(content=body, media_type="application/json")
         
-    except ntplib.NTPException as e:
-        return {
+    except NTPError as e:
+        return ORJSONResponse({
             "status": "error",
             "message": f"NTP server error: {str(e)}"
-        }
-    except pendulum.exceptions.ParserError as e:
-        return {
+        })
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        return ORJSONResponse({
             "status": "error",
             "message": f"Invalid timezone: {str(e)}"
-        }
+        })
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,149 @@
+import asyncio
+import socket
+import struct
+import time
+
+import pytest
+
+import main
+
+def make_reply(query: bytes, tx_time: float = None, leap: int = 0,
+               version: int = 3, mode: int = 4, stratum: int = 1) -> bytes:
+    """Build a server reply to `query`, echoing its transmit timestamp."""
+    reply = bytearray(48)
+    reply[0] = leap << 6 | version << 3 | mode
+    reply[1] = stratum
+    reply[24:32] = query[40:48]
+    if tx_time is None:
+        tx_time = time.time()
+    if tx_time:
+        now = tx_time + main.NTP_EPOCH_OFFSET
+        struct.pack_into("!II", reply, 40, int(now), int((now % 1) * 2**32))
+    return bytes(reply)
+
+class FakeNTPServer(asyncio.DatagramProtocol):
+    """
+    Localhost NTP server. `handle` maps a query to the datagrams sent back.
+    """
+
+    def __init__(self, handle=None):
+        self.handle = handle or (lambda query: [make_reply(query)])
+        self.clients = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.clients.append(addr)
+        for reply in self.handle(data):
+            self.transport.sendto(reply, addr)
+
+async def start_server(handle=None) -> FakeNTPServer:
+    loop = asyncio.get_running_loop()
+    _, server = await loop.create_datagram_endpoint(
+        lambda: FakeNTPServer(handle), local_addr=("127.0.0.1", 0)
+    )
+    main.NTP_PORT = server.transport.get_extra_info("sockname")[1]
+    return server
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    monkeypatch.setattr(main, "NTP_PORT", main.NTP_PORT)
+    monkeypatch.setattr(main, "NTP_TIMEOUT", 0.5)
+    states = (main._dns_cache, main._failed_addresses, main._endpoints)
+    for state in states:
+        state.clear()
+    yield
+    for state in states:
+        state.clear()
+
+def test_build_ntp_query():
+    query = main.build_ntp_query()
+    assert len(query) == 48
+    assert query[0] == 0x1b
+    seconds, fraction = struct.unpack("!II", query[40:48])
+    sent = seconds + fraction / 2**32 - main.NTP_EPOCH_OFFSET
+    assert abs(sent - time.time()) < 1
+
+def test_parse_ntp_reply():
+    query = main.build_ntp_query()
+    assert main.parse_ntp_reply(make_reply(query, 1700000000.5)) == 1700000000.5
+
+@pytest.mark.parametrize("fields", [
+    {"mode": 3},
+    {"version": 4},
+    {"stratum": 0},
+    {"stratum": 16},
+    {"leap": 3},
+    {"tx_time": 0},
+])
+def test_parse_ntp_reply_rejects(fields):
+    reply = make_reply(main.build_ntp_query(), **fields)
+    with pytest.raises(main.NTPError):
+        main.parse_ntp_reply(reply)
+
+def test_reply_must_echo_query():
+    def handle(query):
+        stray = bytearray(query)
+        stray[40:48] = bytes(8)
+        # A stray reply to another query arrives first
+        return [make_reply(bytes(stray), 1000.0), make_reply(query)]
+
+    async def run():
+        await start_server(handle)
+        return await main.ntp_request("127.0.0.1")
+
+    assert abs(asyncio.run(run()) - time.time()) < 1
+
+def test_late_reply_is_ignored():
+    async def run():
+        queries = []
+        await start_server(lambda query: queries.append(query) or [])
+        protocol = await main.get_endpoint("127.0.0.1")
+        first = protocol.query()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(first, timeout=0.1)
+        second = protocol.query()
+        await asyncio.sleep(0.05)
+        # Answer the timed-out query late, then the current one
+        protocol.datagram_received(make_reply(queries[0], 1000.0), None)
+        assert not second.done()
+        protocol.datagram_received(make_reply(queries[1]), None)
+        return main.parse_ntp_reply(await second), protocol.waiters
+
+    tx_time, waiters = asyncio.run(run())
+    assert abs(tx_time - time.time()) < 1
+    assert waiters == {}
+
+def test_icmp_error_fails_query():
+    # Nothing listens on this port, so the kernel answers with ICMP
+    # port-unreachable
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    main.NTP_PORT = sock.getsockname()[1]
+    sock.close()
+
+    async def run():
+        with pytest.raises(OSError):
+            await main.ntp_request("127.0.0.1")
+
+    asyncio.run(run())
+    assert "127.0.0.1" in main._failed_addresses
+    assert "127.0.0.1" not in main._endpoints
+
+def test_endpoint_is_reused():
+    async def run():
+        server = await start_server()
+        for _ in range(3):
+            await main.ntp_request("127.0.0.1")
+        return server.clients
+
+    clients = asyncio.run(run())
+    assert len(clients) == 3
+    assert len(set(clients)) == 1
+    assert list(main._endpoints) == ["127.0.0.1"]
+
+def test_format_gmt_offset():
+    assert main.format_gmt_offset(19800) == "GMT +05:30"
+    assert main.format_gmt_offset(-12600) == "GMT -03:30"
+    assert main.format_gmt_offset(0) == "GMT +00:00"